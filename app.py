@@ -1,12 +1,47 @@
 import streamlit as st
 import pandas as pd
 import os
+import warnings
+import numpy as np
 from io import BytesIO
-import openpyxl  # Ensure this is imported
 import plotly.express as px  # For improved visualizations
-from sklearn.preprocessing import MinMaxScaler, StandardScaler  # For Scaling
 import sweetviz as sv  # For EDA Report
 import datetime  # For the footer
+import hashlib  # For DataFrame cache keys
+import tempfile  # For spilling large uploads to disk
+from concurrent.futures import ThreadPoolExecutor  # For parallel file parsing
+
+try:
+    import pyarrow as pa  # Multi-threaded CSV parser + Arrow-backed columns
+    import pyarrow.csv as pa_csv
+
+    # Same missing-value handling as pd.read_csv: its default NA strings, blank text cells included
+    CSV_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+        null_values=[
+            "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+            "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+        ],
+        strings_can_be_null=True,
+    )
+except ImportError:
+    pa = None  # Fall back to pandas' default C engine
+
+try:
+    from blake3 import blake3 as _content_hasher  # SIMD hashing for cache keys
+except ImportError:
+    _content_hasher = hashlib.blake2b
+
+try:
+    import dask.dataframe as dd  # Out-of-core path for very large CSVs
+except ImportError:
+    dd = None
+
+try:
+    from numba import njit, prange  # JIT-compiled cleaning kernels
+except ImportError:
+    njit = None
+
+pd.set_option("mode.copy_on_write", True)  # Column subsets are views until mutated
 
 # Set up our app - THIS MUST BE FIRST
 st.set_page_config(
@@ -22,6 +57,353 @@ def local_css(file_name):
 local_css("style.css")  # Load the CSS file
 
 
+# Function to shrink numeric columns to the narrowest dtype that holds them - less memory traffic downstream
+def downcast_numeric(df):
+    # dtype predicates rather than select_dtypes so Arrow-backed columns are covered too
+    for c in df.columns:
+        if pd.api.types.is_bool_dtype(df[c]):
+            continue
+        if pd.api.types.is_integer_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], downcast="integer")
+        elif pd.api.types.is_float_dtype(df[c]):
+            # to_numeric only checks allclose, so require an exact float32 round trip to avoid losing digits
+            values = df[c].to_numpy(dtype=np.float64, na_value=np.nan)
+            if np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+                df[c] = pd.to_numeric(df[c], downcast="float")
+    return df
+
+
+# Function to rename repeated headers the way pandas' read_csv does: a, a -> a, a.1
+def dedupe_column_names(names):
+    counts = {}
+    deduped = []
+    for name in names:
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        deduped.append(name)
+        counts[name] = count + 1
+    return deduped
+
+
+def arrow_to_pandas(table):
+    table = table.rename_columns(dedupe_column_names(table.column_names))
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+# Function to parse an uploaded file - cached on its digest so reruns don't re-read unchanged uploads.
+# `_data` is the upload's own buffer (a memoryview), handed to Arrow without copying and not hashed.
+@st.cache_data(show_spinner=False, max_entries=16)
+def _load(name, size, digest, _data) -> pd.DataFrame:
+    file_ext = os.path.splitext(name)[-1].lower()
+    if file_ext == ".csv" and pa is not None:
+        df = arrow_to_pandas(pa_csv.read_csv(pa.BufferReader(pa.py_buffer(_data)), convert_options=CSV_CONVERT_OPTIONS))
+    elif file_ext == ".csv":
+        df = pd.read_csv(BytesIO(_data))
+    elif file_ext == ".xlsx":
+        df = pd.read_excel(BytesIO(_data), engine="calamine")  # Rust-backed reader, much faster than openpyxl
+    else:
+        raise ValueError(f"Unsupported file type: {file_ext}")
+    return downcast_numeric(df)
+
+
+def _load_tuple(args):
+    # Thread-pool friendly wrapper - hands errors back instead of raising in the worker
+    try:
+        return _load(*args), None
+    except Exception as e:
+        return None, e
+
+
+# Function to export Excel in constant memory - xlsxwriter flushes each row to disk as it goes
+def write_excel(df, buffer):
+    with pd.ExcelWriter(buffer, engine="xlsxwriter", engine_kwargs={"options": {"constant_memory": True}}) as writer:
+        df.to_excel(writer, index=False)
+
+
+# Content hash of a DataFrame - used as an explicit cache key for expensive renders
+def frame_hash(df):
+    if df.shape[1] == 0:  # hash_pandas_object can't hash a frame without columns
+        return _content_hasher(str(len(df)).encode()).hexdigest()
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    columns = "\x1f".join(map(str, df.columns)).encode()
+    return _content_hasher(row_hashes.tobytes() + columns).hexdigest()
+
+
+# Function to convert Arrow-backed columns to plain numpy dtypes - Sweetviz chokes on pd.NA
+def numpy_backed(df):
+    if pa is None or not any(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes):
+        return df
+    return pa.Table.from_pandas(df, preserve_index=False).to_pandas()  # Nulls become NaN/None
+
+
+# Function to render the Sweetviz report - cached on the frame's content hash (`_df` itself is not hashed)
+@st.cache_data(show_spinner=False, max_entries=8)
+def _sweetviz_html(df_hash, _df):
+    report = sv.analyze(numpy_backed(_df))
+    report.show_html(filepath=os.devnull, open_browser=False)  # Renders into report._page_html
+    return report._page_html
+
+
+PREVIEW_ROWS = 200
+
+
+# Function to stream a CSV upload as Arrow record batches - only one block is parsed at a time
+def open_csv_batches(data, block_size=8 << 20):
+    return pa_csv.open_csv(
+        pa.BufferReader(pa.py_buffer(data)),
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=CSV_CONVERT_OPTIONS,
+    )
+
+
+# Function to read only the head of a CSV upload - the full parse waits until a section needs it
+@st.cache_data(show_spinner=False, max_entries=16)
+def _preview(name, size, digest, _data, nrows=PREVIEW_ROWS) -> pd.DataFrame:
+    file_ext = os.path.splitext(name)[-1].lower()
+    if file_ext == ".csv" and pa is not None:
+        reader = open_csv_batches(_data, block_size=1 << 20)  # A small first block is plenty for the head
+        try:
+            batch = reader.read_next_batch()  # First block only
+        except StopIteration:
+            return arrow_to_pandas(reader.schema.empty_table())
+        return arrow_to_pandas(pa.Table.from_batches([batch.slice(0, nrows)]))
+    elif file_ext == ".csv":
+        return pd.read_csv(BytesIO(_data), nrows=nrows)
+    raise ValueError(f"No head-only preview for {file_ext} files")
+
+
+# Sections that work on the full frame - their widget state is known before the script renders them
+FULL_FRAME_WIDGETS = ("clean", "viz", "eda", "convert")
+
+
+def needs_full_frame(file):
+    # Excel sheets are parsed whole even with nrows, so they are always loaded fully (once)
+    if not file.name.lower().endswith(".csv"):
+        return True
+    return any(st.session_state.get(f"{w}_{file.name}") for w in FULL_FRAME_WIDGETS)
+
+
+def upload_digest(file):
+    # Memoised per upload so the bytes are hashed once, not on every rerun
+    digests = st.session_state.setdefault("upload_digests", {})
+    if file.file_id not in digests:
+        digests[file.file_id] = _content_hasher(file.getbuffer()).hexdigest()
+    return digests[file.file_id]
+
+
+def _state_key(file):
+    return f"df::{file.name}::{upload_digest(file)}"
+
+
+# Function to drop the frames (and spilled temp dirs) of uploads that were removed or replaced
+def evict_stale_uploads(uploaded_files):
+    live = {_state_key(f) for f in uploaded_files}
+    for key in [k for k in st.session_state if isinstance(k, str) and k.startswith("df::")]:
+        if not any(key == s or key.startswith(s + "::") for s in live):
+            value = st.session_state[key]
+            del st.session_state[key]
+            if isinstance(value, tempfile.TemporaryDirectory):
+                value.cleanup()
+    file_ids = {f.file_id for f in uploaded_files}
+    digests = st.session_state.get("upload_digests", {})
+    for file_id in [i for i in digests if i not in file_ids]:
+        del digests[file_id]
+
+
+# === Cleaning helpers ===
+if njit is not None:
+
+    # fastmath without "nnan" - the full flag set would let LLVM drop the isnan checks
+    @njit(parallel=True, fastmath={"reassoc", "contract", "arcp", "nsz", "afn"}, cache=True)
+    def _nanmean_fill(arr):
+        # Column-parallel NaN-mean + fill in place; all-NaN columns are left as NaN
+        for j in prange(arr.shape[1]):
+            s = 0.0
+            n = 0
+            for i in range(arr.shape[0]):
+                v = arr[i, j]
+                if not np.isnan(v):
+                    s += v
+                    n += 1
+            if n == 0:
+                continue
+            m = s / n
+            for i in range(arr.shape[0]):
+                if np.isnan(arr[i, j]):
+                    arr[i, j] = m
+
+else:
+    _nanmean_fill = None
+
+
+def drop_duplicate_rows(df):
+    # Hash the rows once and reuse the mask for both the count and the filter
+    mask = df.duplicated(keep="first").to_numpy()
+    removed = int(mask.sum())
+    if removed:
+        df = df.loc[~mask].reset_index(drop=True)
+    return df, removed
+
+
+def impute_mean(df, numeric_cols):
+    # One pass over the numeric block: column means once, then a masked write-back
+    # copy=True: under copy-on-write a single float block comes back as a read-only view
+    arr = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    mask = np.isnan(arr)
+    missing = int(mask.sum())
+    if not missing:
+        return df, 0
+    residual = int(mask[:, mask.all(axis=0)].sum())  # All-NaN columns have no mean to fill with
+    if _nanmean_fill is not None:
+        _nanmean_fill(arr)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN columns stay NaN
+            means = np.nanmean(arr, axis=0)
+        rows, cols = np.nonzero(mask)
+        arr[rows, cols] = means[cols]
+    has_missing = mask.any(axis=0)  # Leave complete (e.g. integer) columns untouched
+    df[numeric_cols[has_missing]] = arr[:, has_missing]
+    return df, missing - residual
+
+
+def scale_numeric(df, numeric_cols, scaler_type):
+    # Single pass over a float32 block - same results as sklearn's MinMaxScaler/StandardScaler
+    arr = df[numeric_cols].to_numpy(dtype=np.float32, na_value=np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN columns stay NaN
+        if scaler_type == "MinMaxScaler":
+            mn, mx = np.nanmin(arr, axis=0), np.nanmax(arr, axis=0)
+            arr = (arr - mn) / np.where(mx > mn, mx - mn, 1)
+        else:
+            mu, sd = np.nanmean(arr, axis=0), np.nanstd(arr, axis=0)
+            arr = (arr - mu) / np.where(sd > 0, sd, 1)  # Constant columns are left at 0
+    df[numeric_cols] = arr
+    return df
+
+
+# === Plotting helpers - keep the payload sent to the browser small ===
+MAX_PLOT_ROWS = 5000
+
+
+def plot_sample(df, keep_order=False):
+    if len(df) <= MAX_PLOT_ROWS:
+        return df
+    sample = df.sample(MAX_PLOT_ROWS, random_state=0)
+    return sample.sort_index() if keep_order else sample  # Line charts need the original row order
+
+
+def histogram_frame(series, bins=50):
+    # Bin on the server so only the counts are shipped, not the raw column
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    return pd.DataFrame({series.name: (edges[:-1] + edges[1:]) / 2, "count": counts}), edges[1] - edges[0]
+
+
+# Function to build a chart - cached on (kind, axes, frame hash) so unrelated reruns reuse the figure
+@st.cache_data(show_spinner=False, max_entries=32)
+def _figure(kind, x, y, title, df_hash, _df):
+    if kind == "histogram":
+        hist_df, bin_width = histogram_frame(_df[x])
+        fig = px.bar(hist_df, x=x, y="count", title=title)
+        fig.update_traces(width=bin_width)
+        return fig
+    plot = {"bar": px.bar, "scatter": px.scatter, "line": px.line}[kind]
+    return plot(plot_sample(_df, keep_order=kind == "line"), x=x, y=y, title=title)
+
+
+# === Large CSVs - processed out-of-core with Dask instead of one in-memory DataFrame ===
+LARGE_FILE_BYTES = 500 * 1024 * 1024
+
+
+def is_large_csv(file):
+    return dd is not None and file.size > LARGE_FILE_BYTES and file.name.lower().endswith(".csv")
+
+
+def load_large_csv(file):
+    # Spill the upload to disk once so Dask can read it partition by partition.
+    # The TemporaryDirectory removes itself when it is evicted or garbage collected with the session.
+    work_dir = tempfile.TemporaryDirectory()
+    path = os.path.join(work_dir.name, "upload.csv")
+    with open(path, "wb") as f:
+        f.write(file.getbuffer())
+    return dd.read_csv(path, blocksize="64MB"), work_dir
+
+
+def _scale_partition(part, cols, offset, span):
+    part[cols] = (part[cols] - offset) / span
+    return part
+
+
+def apply_large_step(state_key, ddf, message):
+    # Only keep the new graph once its head computes - a failing graph would break every later rerun
+    try:
+        preview = ddf.head()
+    except Exception as e:
+        st.error(f"❌ Error during cleaning: {e}")
+        return
+    st.session_state[state_key] = ddf
+    st.session_state[f"{state_key}::preview"] = preview  # Reused on reruns instead of rescanning the file
+    st.success(message)
+
+
+def render_large_csv(file, state_key):
+    ddf = st.session_state[state_key]
+
+    st.write(
+        f"📄 **File Name:** `{file.name}` | 📏 **Size:** `{file.size / 1024 ** 2:.2f} MB` | 🧩 **Partitions:** `{ddf.npartitions}` | 🔢 **Columns:** `{len(ddf.columns)}`"
+    )
+    st.info("This file is processed out-of-core. Visualization and the EDA report are not available for it.")
+
+    st.subheader("✨ Data Cleaning & Preparation")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Eliminate Duplicate Rows", key=f"dask_dedup_{file.name}"):
+            apply_large_step(state_key, ddf.drop_duplicates(), "✅ **Duplicate rows removed.**")
+    with col2:
+        if st.button("Impute Missing Values", key=f"dask_impute_{file.name}"):
+            try:
+                means = ddf.mean(numeric_only=True).compute()  # Computed once, not again at export
+                apply_large_step(state_key, ddf.fillna(means), "✅ **Missing values imputed with the mean.**")
+            except Exception as e:
+                st.error(f"❌ Error during cleaning: {e}")
+    with col3:
+        scaler_type = st.selectbox(
+            "Choose Scaling Method", ["MinMaxScaler", "StandardScaler"], key=f"dask_scaler_{file.name}"
+        )
+        if st.button("Scale Numeric Data", key=f"dask_scale_{file.name}"):
+            try:
+                cols = list(ddf.select_dtypes(include=["number"]).columns)
+                numeric = ddf[cols]
+                if scaler_type == "MinMaxScaler":
+                    lo, hi = dd.compute(numeric.min(), numeric.max())
+                    offset, span = lo, hi - lo
+                else:
+                    offset, span = dd.compute(numeric.mean(), numeric.std(ddof=0))
+                span = span.where(span > 0, 1)  # Constant columns are left at 0
+                scaled = ddf.map_partitions(_scale_partition, cols, offset, span)
+                apply_large_step(state_key, scaled, f"✅ **Numeric columns scaled using {scaler_type}.**")
+            except Exception as e:
+                st.error(f"❌ Error during scaling: {e}")
+
+    st.subheader("📊 Data Preview")
+    st.dataframe(st.session_state[f"{state_key}::preview"])
+
+    st.subheader("🔄 File Conversion")
+    if st.button("Convert and Download", key=f"dask_convert_{file.name}"):
+        try:
+            out_path = os.path.join(st.session_state[f"{state_key}::work_dir"].name, "export.csv")
+            st.session_state[state_key].to_csv(out_path, single_file=True, index=False)
+            # The export is written out-of-core, but st.download_button buffers whatever it is given in memory
+            with open(out_path, "rb") as f:
+                st.download_button(label=f"⬇️ Download {file.name}", data=f, file_name=file.name, mime="text/csv")
+        except Exception as e:
+            st.error(f"❌ Error during file conversion: {e}")
+
+
 st.title("Data Insights Toolkit - Streamlining Your Data Workflow")
 st.write(
     """
@@ -39,34 +421,76 @@ with st.container():
     )
 
 
+evict_stale_uploads(uploaded_files or [])
+
 if uploaded_files:
+    # === Parse uploads that a section needs, in parallel (the readers release the GIL) ===
+    load_errors = {}
+    pending = [
+        f
+        for f in uploaded_files
+        if os.path.splitext(f.name)[-1].lower() in (".csv", ".xlsx")
+        and _state_key(f) not in st.session_state
+        and not is_large_csv(f)
+        and needs_full_frame(f)
+    ]
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as ex:
+            jobs = [(f.name, f.size, upload_digest(f), f.getbuffer()) for f in pending]
+            results = list(ex.map(_load_tuple, jobs))
+        for f, (loaded, error) in zip(pending, results):
+            if error is not None:
+                load_errors[_state_key(f)] = error
+            else:
+                st.session_state[_state_key(f)] = loaded
+
     for file in uploaded_files:
         file_ext = os.path.splitext(file.name)[-1].lower()
 
         # === Read File ===
-        try:
-            if file_ext == ".csv":
-                df = pd.read_csv(file)
-            elif file_ext == ".xlsx":
-                df = pd.read_excel(file, engine="openpyxl")  # 🛠 Fix for Excel
-            else:
-                st.error(f"❌ Unsupported file type: {file_ext}")
-                continue
-        except Exception as e:
-            st.error(f"❌ Error loading file: {e}")
+        if file_ext not in (".csv", ".xlsx"):
+            st.error(f"❌ Unsupported file type: {file_ext}")
+            continue
+        # Keep the working copy in session state so cleaning survives reruns
+        state_key = _state_key(file)
+        if is_large_csv(file):
+            if state_key not in st.session_state:
+                try:
+                    ddf, work_dir = load_large_csv(file)
+                    preview = ddf.head()
+                except Exception as e:
+                    st.error(f"❌ Error loading file: {e}")
+                    continue
+                st.session_state[state_key] = ddf
+                st.session_state[f"{state_key}::work_dir"] = work_dir
+                st.session_state[f"{state_key}::preview"] = preview
+            render_large_csv(file, state_key)
+            continue
+        if state_key in load_errors:
+            st.error(f"❌ Error loading file: {load_errors[state_key]}")
             continue
+        df = st.session_state.get(state_key)  # None until a section needs the full frame
+        if df is None:
+            try:
+                preview = _preview(file.name, file.size, upload_digest(file), file.getbuffer())
+            except Exception as e:
+                st.error(f"❌ Error loading file: {e}")
+                continue
+        else:
+            preview = df.head()
 
         # === Display File Details ===
         with st.container():
+            n_rows = df.shape[0] if df is not None else "not loaded yet"
             st.write(
-                f"📄 **File Name:** `{file.name}` | 📏 **Size:** `{file.size / 1024:.2f} KB` | 🔢 **Rows:** `{df.shape[0]}` | 🔢 **Columns:** `{df.shape[1]}`"
+                f"📄 **File Name:** `{file.name}` | 📏 **Size:** `{file.size / 1024:.2f} KB` | 🔢 **Rows:** `{n_rows}` | 🔢 **Columns:** `{preview.shape[1]}`"
             )
 
         # === Show 5 rows of our df ===
         with st.container():
             st.subheader("📊 Data Preview")
             st.write("Get a quick glimpse of your data:")
-            st.dataframe(df.head())
+            st.dataframe(preview.head())
 
         # === Data Cleaning Options ===
         with st.container():
@@ -77,35 +501,34 @@ if uploaded_files:
                 and standardize data for accurate analysis and modeling.
                 """
             )
-            if st.checkbox(f"Enable Data Cleaning for {file.name}"):
+            if st.checkbox(f"Enable Data Cleaning for {file.name}", key=f"clean_{file.name}"):
                 col1, col2, col3 = st.columns(3)  # Added a column for Scaling
 
                 with col1:
                     with st.container():  # Wrap the button
-                        if st.button(f"Eliminate Duplicate Rows"):
-                            initial_rows = len(df)
-                            df.drop_duplicates(inplace=True)
-                            final_rows = len(df)
-                            duplicates_removed = initial_rows - final_rows
+                        if st.button(f"Eliminate Duplicate Rows", key=f"dedup_{file.name}"):
+                            df, duplicates_removed = drop_duplicate_rows(df)
+                            st.session_state[state_key] = df
                             st.success(
                                 f"✅ **{duplicates_removed} duplicate rows successfully removed!**"
                             )
 
                 with col2:
                     with st.container():  # Wrap the button
-                        if st.button(f"Impute Missing Values"):
+                        if st.button(f"Impute Missing Values", key=f"impute_{file.name}"):
                             numeric_cols = df.select_dtypes(include=["number"]).columns
-                            missing_before = df[numeric_cols].isnull().sum().sum()  # Count missing values before
-                            df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].mean())
-                            missing_after = df[numeric_cols].isnull().sum().sum()  # Count after
-                            filled_values = missing_before - missing_after
-                            st.success(
-                                f"✅ **Successfully imputed {filled_values} missing values with the mean.**"
-                            )
+                            try:
+                                df, filled_values = impute_mean(df, numeric_cols)
+                                st.session_state[state_key] = df
+                                st.success(
+                                    f"✅ **Successfully imputed {filled_values} missing values with the mean.**"
+                                )
+                            except Exception as e:
+                                st.error(f"❌ Error during imputation: {e}")
 
                 with col3:
                     with st.container():
-                        if st.button("Scale Numeric Data"):
+                        if st.button("Scale Numeric Data", key=f"scale_{file.name}"):
                             scaler_type = st.selectbox(
                                 "Choose Scaling Method",
                                 ["MinMaxScaler", "StandardScaler"],
@@ -117,12 +540,8 @@ if uploaded_files:
                                 st.warning("No numeric columns to scale.")
                             else:
                                 try:
-                                    if scaler_type == "MinMaxScaler":
-                                        scaler = MinMaxScaler()
-                                    else:
-                                        scaler = StandardScaler()
-
-                                    df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
+                                    df = scale_numeric(df, numeric_cols, scaler_type)
+                                    st.session_state[state_key] = df
                                     st.success(
                                         f"✅ **Successfully scaled numeric columns using {scaler_type}!**"
                                     )
@@ -133,71 +552,73 @@ if uploaded_files:
         with st.container():
             st.subheader("✂️ Column Selection")
             st.write("Select the relevant columns for your analysis:")
-            columns = st.multiselect(f"Select columns for {file.name}", df.columns, default=df.columns)
-            df = df[columns]
+            all_columns = preview.columns if df is None else df.columns
+            columns = st.multiselect(f"Select columns for {file.name}", all_columns, default=all_columns)
+            if df is not None and list(columns) != list(df.columns):  # Default selection needs no copy at all
+                df = df.loc[:, columns]
+        df_hash = None  # Hashed lazily - only the chart and EDA caches need it
 
         # === Data Visualization Options ===
         with st.container():
             st.subheader("📈 Data Visualization")
             st.write("Visualize your data to identify patterns and trends:")
 
-            visualization_type = st.selectbox(
-                "Choose Visualization Type",
-                ["Bar Chart", "Scatter Plot", "Line Chart", "Histogram"],
-                key=f"viz_type_{file.name}",
-            )
+            if st.checkbox(f"Enable Data Visualization for {file.name}", key=f"viz_{file.name}"):
+                visualization_type = st.selectbox(
+                    "Choose Visualization Type",
+                    ["Bar Chart", "Scatter Plot", "Line Chart", "Histogram"],
+                    key=f"viz_type_{file.name}",
+                )
 
-            try:
-                numeric_cols = df.select_dtypes(include=["number"]).columns
-                if len(numeric_cols) < 2 and visualization_type in ["Scatter Plot", "Line Chart"]:
-                    st.warning(
-                        "Scatter Plot and Line Chart require at least two numeric columns. Select more columns or choose a different visualization."
-                    )
-                else:
-                    if visualization_type == "Bar Chart":
-                        if len(numeric_cols) >= 2:
-                            x_axis = st.selectbox("X-axis", numeric_cols, key=f"bar_x_{file.name}")
-                            y_axis = st.selectbox("Y-axis", numeric_cols, key=f"bar_y_{file.name}")
-                            fig = px.bar(df, x=x_axis, y=y_axis, title=f"Bar Chart of {file.name}")
+                try:
+                    numeric_cols = df.select_dtypes(include=["number"]).columns
+                    if len(numeric_cols) < 2 and visualization_type in ["Scatter Plot", "Line Chart"]:
+                        st.warning(
+                            "Scatter Plot and Line Chart require at least two numeric columns. Select more columns or choose a different visualization."
+                        )
+                    else:
+                        if visualization_type == "Bar Chart":
+                            if len(numeric_cols) >= 2:
+                                x_axis = st.selectbox("X-axis", numeric_cols, key=f"bar_x_{file.name}")
+                                y_axis = st.selectbox("Y-axis", numeric_cols, key=f"bar_y_{file.name}")
+                                df_hash = df_hash or frame_hash(df)  # Hashed only once a chart is actually drawn
+                                fig = _figure("bar", x_axis, y_axis, f"Bar Chart of {file.name}", df_hash, df)
+                                st.plotly_chart(fig, use_container_width=True)
+                            else:
+                                st.warning("Bar Chart requires at least two numeric columns.")
+                        elif visualization_type == "Scatter Plot":
+                            x_axis = st.selectbox("X-axis", numeric_cols, key=f"scatter_x_{file.name}")
+                            y_axis = st.selectbox("Y-axis", numeric_cols, key=f"scatter_y_{file.name}")
+                            df_hash = df_hash or frame_hash(df)
+                            fig = _figure("scatter", x_axis, y_axis, f"Scatter Plot of {file.name}", df_hash, df)
                             st.plotly_chart(fig, use_container_width=True)
-                        else:
-                            st.warning("Bar Chart requires at least two numeric columns.")
-                    elif visualization_type == "Scatter Plot":
-                        x_axis = st.selectbox("X-axis", numeric_cols, key=f"scatter_x_{file.name}")
-                        y_axis = st.selectbox("Y-axis", numeric_cols, key=f"scatter_y_{file.name}")
-                        fig = px.scatter(df, x=x_axis, y=y_axis, title=f"Scatter Plot of {file.name}")
-                        st.plotly_chart(fig, use_container_width=True)
-                    elif visualization_type == "Line Chart":
-                        x_axis = st.selectbox("X-axis", numeric_cols, key=f"line_x_{file.name}")
-                        y_axis = st.selectbox("Y-axis", numeric_cols, key=f"line_y_{file.name}")
-                        fig = px.line(df, x=x_axis, y=y_axis, title=f"Line Chart of {file.name}")
-                        st.plotly_chart(fig, use_container_width=True)
-                    elif visualization_type == "Histogram":
-                        if numeric_cols.empty:
-                            st.warning("Histogram requires at least one numeric column.")
-                        else:
-                            x_axis = st.selectbox("Column for Histogram", numeric_cols, key=f"hist_x_{file.name}")
-                            fig = px.histogram(df, x=x_axis, title=f"Histogram of {file.name}")
+                        elif visualization_type == "Line Chart":
+                            x_axis = st.selectbox("X-axis", numeric_cols, key=f"line_x_{file.name}")
+                            y_axis = st.selectbox("Y-axis", numeric_cols, key=f"line_y_{file.name}")
+                            df_hash = df_hash or frame_hash(df)
+                            fig = _figure("line", x_axis, y_axis, f"Line Chart of {file.name}", df_hash, df)
                             st.plotly_chart(fig, use_container_width=True)
+                        elif visualization_type == "Histogram":
+                            if numeric_cols.empty:
+                                st.warning("Histogram requires at least one numeric column.")
+                            else:
+                                x_axis = st.selectbox("Column for Histogram", numeric_cols, key=f"hist_x_{file.name}")
+                                df_hash = df_hash or frame_hash(df)
+                                fig = _figure("histogram", x_axis, None, f"Histogram of {file.name}", df_hash, df)
+                                st.plotly_chart(fig, use_container_width=True)
 
-            except Exception as e:
-                st.error(f"❌ Could not create chart. Error: {e}")
+                except Exception as e:
+                    st.error(f"❌ Could not create chart. Error: {e}")
 
         # === Download EDA Report ===
         with st.container():
             st.subheader("🔍 Exploratory Data Analysis (EDA) Report")
             st.write("Generate an interactive EDA report to gain deeper insights into your data.")
-            if st.button(f"Generate EDA Report"):
+            if st.button(f"Generate EDA Report", key=f"eda_{file.name}"):
                 try:
-                    report = sv.analyze(df)  # Generate the Sweetviz report
-                    report.show_html(f"{file.name}_report.html")  # Save as HTML
-
-                    # Read the HTML content
-                    with open(f"{file.name}_report.html", "r", encoding="utf-8") as f:
-                        html_data = f.read()
-
+                    df_hash = df_hash or frame_hash(df)
+                    html_data = _sweetviz_html(df_hash, df)  # Generate the Sweetviz report
                     st.components.v1.html(html_data, height=800, scrolling=True)  # Embed the HTML
-                    os.remove(f"{file.name}_report.html")  # Clean up
 
                 except Exception as e:
                     st.error(f"❌ Error generating EDA report: {e}")
@@ -206,9 +627,9 @@ if uploaded_files:
         with st.container():
             st.subheader("🔄 File Conversion")
             st.write("Transform your data into your preferred file format:")
-            conversion_type = st.radio(f"Convert {file.name} to:", ["CSV", "Excel"], key=file.name)
+            conversion_type = st.radio(f"Convert {file.name} to:", ["CSV", "Excel", "Parquet"], key=file.name)
 
-            if st.button(f"Convert and Download"):
+            if st.button(f"Convert and Download", key=f"convert_{file.name}"):
                 buffer = BytesIO()
                 try:
                     if conversion_type == "CSV":
@@ -216,9 +637,14 @@ if uploaded_files:
                         file_name = file.name.replace(file_ext, ".csv")
                         mime_type = "text/csv"
                     elif conversion_type == "Excel":
-                        df.to_excel(buffer, index=False, engine="openpyxl")  # ✅ Fixed
+                        write_excel(df, buffer)
                         file_name = file.name.replace(file_ext, ".xlsx")
                         mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    elif conversion_type == "Parquet":
+                        # Columnar + zstd: much smaller than CSV and keeps the dtypes
+                        df.to_parquet(buffer, index=False, engine="pyarrow", compression="zstd", compression_level=3)
+                        file_name = file.name.replace(file_ext, ".parquet")
+                        mime_type = "application/vnd.apache.parquet"
                     buffer.seek(0)
 
                     # Download the File
@@ -226,9 +652,12 @@ if uploaded_files:
                         label=f"⬇️ Download {file_name}", data=buffer, file_name=file_name, mime=mime_type
                     )
                 except Exception as e:
-                    st.error(
-                        f"❌ Error during file conversion: {e}.  Please ensure the 'openpyxl' library is installed if converting to Excel. You can install it with: `pip install openpyxl`"
-                    )
+                    if conversion_type == "Excel":
+                        st.error(
+                            f"❌ Error during file conversion: {e}.  Please ensure the 'xlsxwriter' library is installed if converting to Excel. You can install it with: `pip install xlsxwriter`"
+                        )
+                    else:
+                        st.error(f"❌ Error during file conversion: {e}")
 
     st.success("✅ Data processing complete!")
 